@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+
+Change detection for the @DMV_COVID19 Twitterbot.
+
+Fingerprints the DMV slice of the USA Facts time series so the bots only
+plot and post what actually changed since the last successful run.  Only
+needs requests up to the point something changed, so unchanged runs skip
+the slow pandas/matplotlib imports.
+
+@author: Michael Dickey
+
+"""
+
+## Essential packages
+import io
+import json
+import hashlib
+import requests
+from datetime import datetime
+
+### States covered by the bot
+DMV_STATES = ['DC', 'MD', 'VA']
+
+
+def load_fingerprints(path):
+    """
+    Read the fingerprints saved by the last successful run.
+
+    :param path (str): Location of the JSON fingerprint file
+    :return: dict; empty if the bot has never saved fingerprints
+    """
+
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_fingerprints(fingerprints, path):
+    """
+    Overwrite the fingerprint file.  Call this right after each post, only
+     updating the entries for what was posted, so a failed run picks up
+     where it stopped.
+
+    :param fingerprints (dict): Fingerprints and HTTP validators by series
+    :param path (str): Location of the JSON fingerprint file
+    """
+
+    with open(path, 'w') as f:
+        json.dump(fingerprints, f, indent = 1, sort_keys = True)
+
+
+def fetch_csv(url, previous = None):
+    """
+    Conditionally download a USA Facts CSV.  The ETag/Last-Modified from the
+     previous run are sent along so an unchanged file costs a single 304 and
+     is never downloaded or parsed.
+
+    :param url (str): Location of the CSV
+    :param previous (dict): Fingerprint entry for the series from the last run
+    :return: tuple of (DataFrame or None if unchanged, dict of HTTP validators)
+    """
+
+    validators = (previous or {}).get('validators', {})
+    headers = {}
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+
+    response = requests.get(url, headers = headers)
+    if response.status_code == 304:
+        return None, validators
+    response.raise_for_status()
+
+    validators = {'etag': response.headers.get('ETag'),
+                  'last_modified': response.headers.get('Last-Modified')}
+    import pandas as pd
+    file_object = io.StringIO(response.content.decode('utf-8'))
+    return pd.read_csv(file_object), validators
+
+
+def date_columns(data):
+    """
+    Find the date columns of the USA Facts data.
+
+    :param data (DataFrame): DataFrame in raw USA Facts format
+    :return: list of (column name, datetime) tuples
+    """
+
+    columns = []
+    for col in data.columns:
+        if '/' in col:
+            if len(col) > 8:
+                fmt = "%m/%d/%Y"
+            else:
+                fmt = "%m/%d/%y"
+            columns.append((col, datetime.strptime(col, fmt)))
+
+    return columns
+
+
+def fingerprint_dates(data, states = DMV_STATES):
+    """
+    Hash every date column of the USA Facts data separately for each state,
+     covering all of the state's counties.  Keys are ISO dates so a switch
+     between 2- and 4-digit years upstream doesn't look like new data.
+
+    :param data (DataFrame): DataFrame in raw USA Facts format
+    :param states (list): Abbreviations for the states to fingerprint
+    :return: dict; {state: {date: hash}}
+    """
+
+    columns = date_columns(data)
+    fingerprints = {}
+    for state in states:
+        state_df = data[data['State'] == state].sort_values('countyFIPS')
+        counties = state_df['countyFIPS'].values.astype('int64').tobytes()
+        state_fingerprints = {}
+        for col, date in columns:
+            values = state_df[col].fillna(0).values.astype('int64').tobytes()
+            state_fingerprints[date.strftime("%Y-%m-%d")] = hashlib.md5(counties + values).hexdigest()[:16]
+        fingerprints[state] = state_fingerprints
+
+    return fingerprints
+
+
+def fingerprint_totals(data, states = DMV_STATES, after = datetime(2020, 3, 9)):
+    """
+    Statewide totals for each date after the cutoff, i.e. only the numbers the
+     update tweets show.  Cases moving between counties or revisions before
+     the cutoff don't change these.
+
+    :param data (DataFrame): DataFrame in raw USA Facts format
+    :param states (list): Abbreviations for the states to fingerprint
+    :param after (datetime): Dates on or before this are left out
+    :return: dict; {state: {date: total}}
+    """
+
+    columns = [(col, date) for col, date in date_columns(data) if date > after]
+    fingerprints = {}
+    for state in states:
+        state_df = data[data['State'] == state]
+        fingerprints[state] = {date.strftime("%Y-%m-%d"): int(state_df[col].fillna(0).sum())
+                               for col, date in columns}
+
+    return fingerprints
+
+
+def plan_changes(previous, current):
+    """
+    Compare two sets of fingerprints from fingerprint_dates() or fingerprint_totals().
+
+    :param previous (dict): Fingerprints saved by the last run
+    :param current (dict): Fingerprints of the freshly downloaded data
+    :return: dict; {state: {'new': [dates], 'revised': [dates]}} with only
+     the states that changed
+    """
+
+    changes = {}
+    for state, dates in current.items():
+        old_dates = previous.get(state, {})
+        new = sorted(d for d in dates if d not in old_dates)
+        revised = sorted(d for d in dates if d in old_dates and dates[d] != old_dates[d])
+        if new or revised:
+            changes[state] = {'new': new, 'revised': revised}
+
+    return changes
+
+
+def revision_note(dates):
+    """
+    Phrase a status prefix naming the days upstream revised, so re-posts
+     differ from the original tweet.
+
+    :param dates (list): Revised dates in %Y-%m-%d format
+    :return: str
+    """
+
+    dates = sorted(dates)
+    first = datetime.strptime(dates[0], "%Y-%m-%d").strftime("%b. %d")
+    last = datetime.strptime(dates[-1], "%Y-%m-%d").strftime("%b. %d")
+    if len(dates) == 1:
+        return f"Revised data for {first}: "
+    else:
+        return f"Revised data for {first}-{last} ({len(dates)} days): "
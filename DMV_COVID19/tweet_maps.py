@@ -10,41 +10,64 @@ Script to tweet maps for the @DMV_COVID19 Twitterbot.
 ## Essential packages
 import io
 import requests
-import numpy as np
-import pandas as pd
-import geopandas as gpd
-from twython import Twython
 from datetime import datetime
-import matplotlib.pyplot as plt
+
+## Data, mapping and Twitter packages are slow to import, so they're only
+## loaded by load_libraries() once there is something to tweet
+np = pd = gpd = plt = None
 
 ## Twitter API keys and access info
 import tweet_config as config
 
-### Connect to Twitter API
-api = Twython(config.api_key, config.api_secret,
-              config.access_token,
-              config.access_token_secret)
+## Change detection for the USA Facts data
+import data_fingerprint as fp
+
+### USA Facts data
+SERIES_URLS = {'Confirmed': "https://usafactsstatic.blob.core.windows.net/public/data/covid-19/covid_confirmed_usafacts.csv",
+               'Deaths': "https://usafactsstatic.blob.core.windows.net/public/data/covid-19/covid_deaths_usafacts.csv"}
+POPULATION_URL = "https://usafactsstatic.blob.core.windows.net/public/data/covid-19/covid_county_population_usafacts.csv"
+FINGERPRINT_PATH = "log/DMV_COVID19_map_fingerprints.json"
+
+### Twitter API connection, set up by load_libraries()
+api = None
+
 
-def setup_data():
+def load_libraries():
     """
-    Function to set up 2 GeoDataFrames with the number of confirmed cases and deaths by county.
-    
-    :return: dict; A dictionary with 2 keys, "Confirmed" and "Deaths", each containing a GeoDataFrame as a value 
+    Import the data/mapping packages and connect to the Twitter API.  Only
+     needed once a series has changed.
     """
+    
+    global np, pd, gpd, plt, api
+    if gpd is not None:
+        return
+    
+    import numpy as np
+    import pandas as pd
+    import geopandas as gpd
+    from twython import Twython
+    import matplotlib.pyplot as plt
+    
+    ### Connect to Twitter API
+    if api is None:
+        api = Twython(config.api_key, config.api_secret,
+                      config.access_token,
+                      config.access_token_secret)
 
-    ### Read in current data from usafacts.org
-    confirmed_response = requests.get("https://usafactsstatic.blob.core.windows.net/public/data/covid-19/covid_confirmed_usafacts.csv")
-    confirmed_file_object = io.StringIO(confirmed_response.content.decode('utf-8'))
-    confirmed_df = pd.read_csv(confirmed_file_object)
-    deaths_response = requests.get("https://usafactsstatic.blob.core.windows.net/public/data/covid-19/covid_deaths_usafacts.csv")
-    deaths_file_object = io.StringIO(deaths_response.content.decode('utf-8'))
-    deaths_df = pd.read_csv(deaths_file_object)
+
+def setup_data(series_dfs):
+    """
+    Function to set up GeoDataFrames with the number of confirmed cases and/or deaths by county.
+    
+    :param series_dfs (dict): Raw USA Facts DataFrames keyed by series ("Confirmed"/"Deaths")
+    :return: dict; A dictionary with the same keys, each containing a GeoDataFrame as a value 
+    """
     
     ## Read in crosswalk of Maryland county names since shapefile didn't come with FIPS
     md_crosswalk = pd.read_csv("shapefiles/md_shapefile_usafact_mapping.csv")
     
     ## Read in population from 2019 Census estimates
-    pop_response = requests.get("https://usafactsstatic.blob.core.windows.net/public/data/covid-19/covid_county_population_usafacts.csv")
+    pop_response = requests.get(POPULATION_URL)
     pop_file_object = io.StringIO(pop_response.content.decode('utf-8'))
     pop_df = pd.read_csv(pop_file_object)
     pop_df = pop_df.drop(['County Name', 'State'], axis = 1)
@@ -71,25 +94,24 @@ def setup_data():
     ## Merge the population in with the geometry
     states_gdf = states_gdf.merge(pop_df, on = 'countyFIPS')
     
-    ## Merge the geometry df with deaths and confirmed_df
-    states_confirmed_gdf = states_gdf.merge(confirmed_df, on = 'countyFIPS')
-    states_deaths_gdf    = states_gdf.merge(deaths_df,    on = 'countyFIPS')
-    
-    ## Combine into a dictionary
-    gdf_dict = {'Confirmed': states_confirmed_gdf,
-                'Deaths': states_deaths_gdf}
+    ## Merge the geometry df with each series and combine into a dictionary
+    gdf_dict = {series: states_gdf.merge(df, on = 'countyFIPS')
+                for series, df in series_dfs.items()}
     
     return gdf_dict
 
 
-def tweet_image(gdf, series_name, top_n = 5, pop_adjusted = False):
+def tweet_image(gdf, series_name, top_n = 5, pop_adjusted = False,
+                revised_dates = None, posted_statuses = ()):
     """
     Function to tweet an image with choropleth map images for the most recent day of data.
     
     :param gdf (GeoDataFrame): GeoDataFrame with geometry of counties and dates in columns
     :param series_name (str): Either 'Confirmed' or 'Deaths', determines the wording of the tweet
     :param top_n (int): Top counties to list in the tweet
-    :return: None; saves image to "plots" and tweets the image
+    :param revised_dates (list): Dates upstream revised, when this re-posts a revised day
+    :param posted_statuses (list): Statuses already posted, which won't be posted again
+    :return: str; the status tweeted or None if it was already posted. Also saves image to "plots"
     """
     
     ## Find the last day in the data
@@ -159,29 +181,113 @@ def tweet_image(gdf, series_name, top_n = 5, pop_adjusted = False):
         phrasing = 'COVID-19 deaths'
 
     
-    ## Tweet the image
-    status = f'Number of {phrasing} {pop_adj_note} in the DMV by county, as of {last_day_dt_str}.\n\nTop {top_n}:\n{top_phrasing}'
+    ## Name the revised day in re-posts so the status differs from the original
+    if revised_dates:
+        revision_note = fp.revision_note(revised_dates)
+    else:
+        revision_note = ''
+    
+    ## List fewer counties (down to none) if the status runs over 280 characters
+    top_lines = top_phrasing.splitlines(keepends = True)
+    status = None
+    for n in range(len(top_lines), -1, -1):
+        if n > 0:
+            top_section = f'\n\nTop {n}:\n{"".join(top_lines[:n])}'
+        else:
+            top_section = ''
+        candidate = f'{revision_note}Number of {phrasing} {pop_adj_note} in the DMV by county, as of {last_day_dt_str}.{top_section}'
+        if len(candidate) <= 280:
+            status = candidate
+            break
+    if status is None:
+        raise ValueError(f'Status for the {series_name} map is over 280 characters even without counties: {candidate}')
     source_note = '\n\nSource: @usafacts #MadewithUSAFacts.'
     if (len(status) + len(source_note)) > 280:
         pass
     else:
         status = status + source_note
-    image_open = open(img_path, 'rb')
-    response = api.upload_media(media = image_open)
-    api.update_status(status=status, media_ids = [response['media_id']])
+    
+    ## Twitter rejects duplicate statuses
+    if status in posted_statuses:
+        return None
+    
+    ## Tweet the image
+    with open(img_path, 'rb') as image_open:
+        response = api.upload_media(media = image_open)
+        api.update_status(status=status, media_ids = [response['media_id']])
+    
+    return status
+
 
+def plan_maps(changes, latest_date):
+    """
+    Decide whether a series needs its maps (re-)posted.  The maps only show the
+     latest day, so revisions to earlier days don't need a re-post.
+    
+    :param changes (dict): Output of data_fingerprint.plan_changes() for one series
+    :param latest_date (str): Latest date in the series
+    :return: tuple of (bool whether to post, list of revised dates or None)
+    """
     
+    if any(c['new'] for c in changes.values()):
+        return True, None
+    elif any(latest_date in c['revised'] for c in changes.values()):
+        return True, [latest_date]
     
+    return False, None
+
+
 def main():
     """
-    Put all of the functions above together and run them for each dataset.
+    Put all of the functions above together and run them for each dataset that changed.
     """
     
-    gdf_dict = setup_data()
+    ## Only download and plan work for series that changed since the last run
+    fingerprints = fp.load_fingerprints(FINGERPRINT_PATH)
+    downloads = {}
+    series_dfs = {}
+    plans = {}
+    for series, url in SERIES_URLS.items():
+        previous = fingerprints.get(series, {})
+        df, validators = fp.fetch_csv(url, previous)
+        if df is None:
+            ## Not modified upstream
+            continue
+        
+        dates = fp.fingerprint_dates(df)
+        downloads[series] = {'validators': validators, 'dates': dates}
+        latest_date = max(max(state_dates) for state_dates in dates.values())
+        post, revised_dates = plan_maps(fp.plan_changes(previous.get('dates', {}), dates), latest_date)
+        if post:
+            series_dfs[series] = df
+            plans[series] = revised_dates
+    
+    if len(plans) > 0:
+        load_libraries()
+        gdf_dict = setup_data(series_dfs)
+        for series in gdf_dict:
+            posted = fingerprints.get(series, {}).get('posted_statuses', [])
+            for pop_adjusted in [False, True]:
+                status = tweet_image(gdf_dict[series], series, pop_adjusted = pop_adjusted,
+                                     revised_dates = plans[series], posted_statuses = posted)
+                
+                ## Save progress after each map so a failure later in the run
+                ## doesn't re-post this one
+                if status is not None:
+                    posted = (posted + [status])[-20:]
+                    fingerprints[series] = dict(fingerprints.get(series, {}),
+                                                posted_statuses = posted)
+                    fp.save_fingerprints(fingerprints, FINGERPRINT_PATH)
             
-    for series in gdf_dict:
-        tweet_image(gdf_dict[series], series)
-        tweet_image(gdf_dict[series], series, pop_adjusted = True)
+            ## Both maps are up to date, so skip the download until upstream changes
+            fingerprints[series] = dict(fingerprints.get(series, {}), **downloads.pop(series))
+            fp.save_fingerprints(fingerprints, FINGERPRINT_PATH)
+    
+    ## Series that changed without needing new maps
+    if len(downloads) > 0:
+        for series in downloads:
+            fingerprints[series] = dict(fingerprints.get(series, {}), **downloads[series])
+        fp.save_fingerprints(fingerprints, FINGERPRINT_PATH)
 
 if __name__ == "__main__":
     main()
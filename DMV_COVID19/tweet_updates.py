@@ -10,37 +10,29 @@ Tweets daily updates on trends in DC, Maryland, and Virginia COVID-19 data.
 """
 
 ## Essential packages
-import io
-import requests
-import numpy as np
-import pandas as pd
-from twython import Twython
 from datetime import datetime
 
-## Viz
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns; sns.set(color_codes=True)
+## Data, viz and Twitter packages are slow to import on the Pi, so they're
+## only loaded by load_libraries() once there is something to tweet
+np = pd = plt = sns = None
 
 ## Twitter API keys and access info
 import tweet_config as config
 
-### Read in current data from usafacts.org
-confirmed_response = requests.get("https://static.usafacts.org/public/data/covid-19/covid_confirmed_usafacts.csv")
-confirmed_file_object = io.StringIO(confirmed_response.content.decode('utf-8'))
-confirmed_df = pd.read_csv(confirmed_file_object)
-deaths_response = requests.get("https://usafactsstatic.blob.core.windows.net/public/data/covid-19/covid_deaths_usafacts.csv")
-deaths_file_object = io.StringIO(deaths_response.content.decode('utf-8'))
-deaths_df = pd.read_csv(deaths_file_object)
-DF_DICT = {'Confirmed': {'df': confirmed_df,
+## Change detection for the USA Facts data
+import data_fingerprint as fp
+
+### USA Facts data is downloaded in main(), only if it changed since the last run
+DF_DICT = {'Confirmed': {'url': "https://static.usafacts.org/public/data/covid-19/covid_confirmed_usafacts.csv",
+                     'df': None,
                      'series_title': 'Number of Confirmed COVID-19 Cases',
                      'curve_title': 'New reported cases by day',
                      'curve_color': 'salmon',
                      'curve_y_axis': 'Confirmed Cases',
                      'status': 'confirmed cases of',
                      'new_case_status': 'new reported cases of'}, 
-       'Deaths': {'df': deaths_df,
+       'Deaths': {'url': "https://usafactsstatic.blob.core.windows.net/public/data/covid-19/covid_deaths_usafacts.csv",
+                  'df': None,
                   'series_title': 'Number of COVID-19 Deaths',
                   'curve_title': 'New reported deaths by day',
                   'curve_color': '#737373',
@@ -49,15 +41,10 @@ DF_DICT = {'Confirmed': {'df': confirmed_df,
                   'new_case_status': 'new reported deaths of'}
        }
 
-### Read in log data
-TWEET_HISTORY_DF = pd.read_csv("log/DMV_COVID19_full_tweet_log.csv")
-TWEET_HISTORY_DF['data_date'] = (TWEET_HISTORY_DF['data_date'].apply(lambda x: 
-                                  datetime.strptime(x,"%Y-%m-%d")))
-
-### Connect to Twitter API
-api = Twython(config.api_key, config.api_secret,
-              config.access_token,
-              config.access_token_secret)
+### Log data and Twitter API connection, set up by load_libraries()
+TWEET_HISTORY_DF = None
+api = None
+FINGERPRINT_PATH = "log/DMV_COVID19_update_fingerprints.json"
 
 
 ### States of interest
@@ -67,6 +54,55 @@ STATES = {'DC': 'D.C',
           'All': 'the DMV'}
 
 
+def load_libraries():
+    """
+    Import the data/viz packages, read in the log data and connect to the
+     Twitter API.  Only needed once a series has changed.
+    """
+    
+    global np, pd, plt, sns, TWEET_HISTORY_DF, api
+    if pd is not None:
+        return
+    
+    ## Essential packages
+    import numpy as np
+    import pandas as pd
+    from twython import Twython
+    
+    ## Viz
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns; sns.set(color_codes=True)
+    
+    ### Read in log data
+    TWEET_HISTORY_DF = pd.read_csv("log/DMV_COVID19_full_tweet_log.csv")
+    TWEET_HISTORY_DF['data_date'] = (TWEET_HISTORY_DF['data_date'].apply(lambda x: 
+                                      datetime.strptime(x,"%Y-%m-%d")))
+    if 'series_type' not in TWEET_HISTORY_DF.columns:
+        TWEET_HISTORY_DF['series_type'] = None
+    
+    ### Connect to Twitter API
+    if api is None:
+        api = Twython(config.api_key, config.api_secret,
+                      config.access_token,
+                      config.access_token_secret)
+
+
+def load_series(series_type):
+    """
+    Download a time series from usafacts.org into DF_DICT.  main() downloads
+     only what changed, so this covers using RonaTweeter on its own.
+    
+    :param series_type (str): Type of series of interest (Confirmed/Deaths)
+    
+    :return: DataFrame in raw format
+    """
+    
+    DF_DICT[series_type]['df'] = fp.fetch_csv(DF_DICT[series_type]['url'])[0]
+    return DF_DICT[series_type]['df']
+
+
 def tidy_timeseries(data, state, series_type, county = None):
     """
     Function to take USA Facts time series data and put it into a tidy format
@@ -146,6 +182,9 @@ class RonaTweeter():
         self.state = state
         self.series_type = series_type
         self.county = county
+        load_libraries()
+        if DF_DICT[series_type]['df'] is None:
+            load_series(series_type)
         self.tidy_data = tidy_timeseries(DF_DICT[series_type]['df'],
                                          state, series_type, county)
         self.ts_plot_location = None
@@ -264,25 +303,42 @@ class RonaTweeter():
         return filename, status
     
     
-    def send_tweet(self, tweet_type):
+    def send_tweet(self, tweet_type, revised_dates = None):
         """
         Method to send tweets conditional upon no other tweets in the log 
         sent for the given state/series
         
+        :param tweet_type (str): Type of tweet (new_cases/time_series)
+        :param revised_dates (list): Earlier dates upstream revised; re-posts even
+         if the latest date was already tweeted
         """
         
-        ## Limit the tweet_history to the state and get the most recent date
-        tweet_history_state = TWEET_HISTORY_DF[TWEET_HISTORY_DF['location'] == self.state]
+        ## Limit the tweet_history to the state/series and get the most recent date
+        ## (older log rows have no series and were always sent for both)
+        tweet_history_state = TWEET_HISTORY_DF[(TWEET_HISTORY_DF['location'] == self.state) &
+                                               ((TWEET_HISTORY_DF['series_type'] == self.series_type) |
+                                                TWEET_HISTORY_DF['series_type'].isnull())]
         max_dt_state_history = tweet_history_state['data_date'].max()
         
-        ## If there's a new date in the data for that state make a status and a plot
-        if self.tidy_data['Date'].max() > max_dt_state_history:
+        ## If there's a new date in the data for that state (or a revision) make a status and a plot
+        if revised_dates or self.tidy_data['Date'].max() > max_dt_state_history:
                         
             ## Get the plot/status based on the tweet_type
             if tweet_type == 'new_cases':
                 plot_filename, status = self.new_case_curve()
+                status_column = 'new_case_status'
             elif tweet_type == 'time_series':
                 plot_filename, status = self.plot_timeseries()
+                status_column = 'status'
+            
+            ## Name the revised days in re-posts, and skip ones that were already
+            ## posted since Twitter rejects duplicate statuses
+            if revised_dates:
+                status = f"{fp.revision_note(revised_dates)}{status}"
+                if status in set(tweet_history_state[status_column]):
+                    self.log_df = self.log_df.iloc[:-1] if len(self.log_df) > 1 else None
+                    return
+                self.log_df.iloc[-1, self.log_df.columns.get_loc(status_column)] = status
             
             ## Tweet the status
             with open(plot_filename, 'rb') as img_open:
@@ -302,7 +358,8 @@ class RonaTweeter():
                                     'data_date': [current_date],
                                     'location': [location],
                                     'new_case_plot_filepath': [new_case_plot_name],
-                                    'new_case_status': [new_case_status]})
+                                    'new_case_status': [new_case_status],
+                                    'series_type': [self.series_type]})
         
         ## Append if there's an existing DF in the log    
         if self.log_df is not None:
@@ -314,15 +371,68 @@ class RonaTweeter():
         return log_df
 
 
+def location_dates(loc, dates):
+    """
+    Subset fingerprints from data_fingerprint.fingerprint_totals() to the states
+     shown in a location's tweet.
+    
+    :param loc (str): Key of the location in STATES
+    :param dates (dict): Fingerprints for one series
+    :return: dict; {state: {date: hash}}
+    """
+    
+    if loc == 'All':
+        return {s: dates[s] for s in fp.DMV_STATES}
+    else:
+        return {loc: dates[loc]}
+
+
+def plan_tweets(posted, dates):
+    """
+    Decide which locations need a tweet based on what changed in a series since
+     each location was last posted.
+    
+    :param posted (dict): Fingerprints of the data last posted, by location
+    :param dates (dict): Fingerprints of the freshly downloaded series
+    :return: dict; {location: None for new data, or a list of revised dates}
+     for locations that changed
+    """
+    
+    plan = {}
+    for loc in STATES.keys():
+        changes = fp.plan_changes(posted.get(loc, {}), location_dates(loc, dates))
+        
+        ## New dates take priority, otherwise only re-post for revised days
+        if any(c['new'] for c in changes.values()):
+            plan[loc] = None
+        elif len(changes) > 0:
+            plan[loc] = sorted(set(d for c in changes.values() for d in c['revised']))
+    
+    return plan
+
+
 def main():
     """
     Run the whole way through and send tweets for all states and series when necessary.
     """
     
-    logs = []    
-    ## Iterate through the time series and states
+    fingerprints = fp.load_fingerprints(FINGERPRINT_PATH)
+    run_log_path = f"log/tweet_log_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.csv"
+    logs = []
+    
+    ## Iterate through the time series, skipping the ones not modified upstream
     for series in DF_DICT.keys():
-        for loc in STATES.keys():
+        previous = fingerprints.get(series, {})
+        df, validators = fp.fetch_csv(DF_DICT[series]['url'], previous)
+        if df is None:
+            continue
+        
+        DF_DICT[series]['df'] = df
+        dates = fp.fingerprint_totals(df)
+        posted = previous.get('locations', {})
+        
+        ## Iterate through the states whose data changed
+        for loc, revised_dates in plan_tweets(posted, dates).items():
             
             ## Instantiate a class to do the tweetin'
             MyRonaTweeter = RonaTweeter(state = loc, series_type = series)
@@ -330,22 +440,28 @@ def main():
             ## Create the plots, statuses and tweet
             if loc == 'All':
                 ### Timeseries lineplot for "All" states
-                MyRonaTweeter.send_tweet(tweet_type = 'time_series')
+                MyRonaTweeter.send_tweet(tweet_type = 'time_series', revised_dates = revised_dates)
             else:
                 # New case curves for individual states
-                MyRonaTweeter.send_tweet(tweet_type = 'new_cases')
+                MyRonaTweeter.send_tweet(tweet_type = 'new_cases', revised_dates = revised_dates)
             
+            ## Save progress after each tweet so a failure later in the run
+            ## doesn't re-post this one
             if MyRonaTweeter.log_df is not None:
-                ## If there was a tweet logged, add it to the list
                 logs.append(MyRonaTweeter.log_df)
-    
-    if len(logs) > 0:
-        tweets_sent_df = pd.concat(logs)
-        tweets_sent_df.to_csv(f"log/tweet_log_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.csv",
-                              index = False)
-        new_log_df = pd.concat([TWEET_HISTORY_DF, tweets_sent_df], sort = False)
-        new_log_df.to_csv("log/DMV_COVID19_full_tweet_log.csv",
-                          index = False)
+                tweets_sent_df = pd.concat(logs)
+                tweets_sent_df.to_csv(run_log_path, index = False)
+                new_log_df = pd.concat([TWEET_HISTORY_DF, tweets_sent_df], sort = False)
+                new_log_df.to_csv("log/DMV_COVID19_full_tweet_log.csv",
+                                  index = False)
+            posted[loc] = location_dates(loc, dates)
+            fingerprints[series] = {'validators': previous.get('validators', {}),
+                                    'locations': posted}
+            fp.save_fingerprints(fingerprints, FINGERPRINT_PATH)
+        
+        ## Every location is up to date, so skip the download until upstream changes
+        fingerprints[series] = {'validators': validators, 'locations': posted}
+        fp.save_fingerprints(fingerprints, FINGERPRINT_PATH)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,645 @@
+# -*- coding: utf-8 -*-
+"""
+
+Offline replay harness for @DMV_COVID19 and @SunsetWxBot.
+
+Drives the real main() of each bot day by day from archived USA Facts CSV
+snapshots and recorded SunsetWx responses, with local stand-ins for USA Facts,
+SunsetWx and Twitter, and reports throughput and log-file growth.
+
+Every scheduled run starts the bot in a new interpreter, like cron does, so
+run times include the imports.  Each bot can use its own conda environment's
+Python (--python updates=... maps=... sunsetwx=...); the harness itself only
+needs the standard library and Python 3.6.
+
+Archive layout:
+
+    archive/usafacts/YYYY-MM-DD/covid_confirmed_usafacts.csv
+    archive/usafacts/YYYY-MM-DD/covid_deaths_usafacts.csv
+    archive/usafacts/YYYY-MM-DD/covid_county_population_usafacts.csv  (maps only)
+    archive/sunsetwx/locations.json  ({name: {lat, lon, timezone}})
+    archive/sunsetwx/YYYY-MM-DD/<name>_<sunrise|sunset>.json
+    archive/logs/<log csv>  (optional starting logs, otherwise seeded)
+    archive/shapefiles/  (maps only, defaults to DMV_COVID19/shapefiles)
+
+A day without a USA Facts snapshot keeps serving the previous one, like an
+upstream that hasn't updated.  SunsetWx recordings can be the full response or
+just features[0].properties.
+
+Usage:
+    python replay.py archive --bots updates sunsetwx --report replay_report.csv
+
+@author: Michael Dickey
+
+"""
+
+## Essential packages
+import os
+import sys
+import csv
+import glob
+import json
+import time
+import types
+import bisect
+import shutil
+import argparse
+import tempfile
+import threading
+import traceback
+import subprocess
+import socketserver
+import email.utils
+import importlib.util
+from datetime import datetime, timedelta
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+### Source locations of the bots
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+## 'log' is the log the bot needs to start from, 'log_files' what it writes to log/
+BOTS = {'updates': {'dir': 'DMV_COVID19', 'script': 'tweet_updates.py',
+                    'log': 'DMV_COVID19_full_tweet_log.csv',
+                    'log_files': ['DMV_COVID19_full_tweet_log.csv', 'tweet_log_*.csv',
+                                  'DMV_COVID19_update_fingerprints.json']},
+        'maps': {'dir': 'DMV_COVID19', 'script': 'tweet_maps.py',
+                 'log': None,
+                 'log_files': ['DMV_COVID19_map_fingerprints.json']},
+        'sunsetwx': {'dir': 'SunsetWxBot', 'script': 'tweet_updates.py',
+                     'log': 'SunsetWx_full_tweet_log.csv',
+                     'log_files': ['SunsetWx_full_tweet_log.csv']}}
+
+### Report columns, one row per run
+REPORT_FIELDS = ['run_time', 'bot', 'status', 'seconds', 'import_seconds', 'main_seconds',
+                 'tweets', 'sunsetwx_calls', 'log_bytes', 'log_files', 'error']
+
+
+class SimulatedDatetime(datetime):
+    """
+    Stand-in for datetime in the bot modules so "now" follows the replay.
+    """
+
+    NOW = None
+
+    @classmethod
+    def now(cls, tz = None):
+        return cls.NOW
+
+    @classmethod
+    def today(cls):
+        return cls.NOW
+
+
+class StubTwitter():
+    """
+    Stand-in for the Twython client of one account.  Statuses posted within the
+     duplicate window (in simulated time) are kept in a JSON file between runs.
+     Strict mode raises TwythonError for recent duplicate and over-length
+     statuses like Twitter does, otherwise they are only counted.
+    """
+
+    def __init__(self, path, now, strict = True, duplicate_window = timedelta(hours = 24)):
+        self.path = path
+        self.now = now
+        self.strict = strict
+        try:
+            with open(path) as f:
+                self.state = json.load(f)
+        except FileNotFoundError:
+            self.state = {'recent': {}, 'n_statuses': 0, 'n_media': 0, 'media_bytes': 0,
+                          'n_duplicates': 0, 'n_too_long': 0}
+
+        ## Twitter only rejects duplicates of recent statuses
+        cutoff = (now - duplicate_window).strftime("%Y-%m-%d %H:%M")
+        self.state['recent'] = {status: posted_at for status, posted_at in self.state['recent'].items()
+                                if posted_at > cutoff}
+        self.n_posted = 0
+
+    def upload_media(self, media):
+        self.state['n_media'] += 1
+        self.state['media_bytes'] += len(media.read())
+        return {'media_id': self.state['n_media']}
+
+    def update_status(self, status, media_ids = None):
+        if status in self.state['recent']:
+            self.state['n_duplicates'] += 1
+            if self.strict:
+                from twython import TwythonError
+                raise TwythonError('Twitter API returned a 403 (Forbidden), Status is a duplicate.',
+                                   error_code = 403)
+        if len(status) > 280:
+            self.state['n_too_long'] += 1
+            if self.strict:
+                from twython import TwythonError
+                raise TwythonError('Twitter API returned a 403 (Forbidden), Status is over 280 characters.',
+                                   error_code = 403)
+        self.state['recent'][status] = self.now.strftime("%Y-%m-%d %H:%M")
+        self.state['n_statuses'] += 1
+        self.n_posted += 1
+        return {'id': self.state['n_statuses']}
+
+    def save(self):
+        """
+        Write the state once at the end of the run, outside of the timed main().
+        """
+
+        with open(self.path, 'w') as f:
+            json.dump(self.state, f)
+
+
+class StubSunsetWx():
+    """
+    Stand-in for the PySunsetWx client, serving the recordings the harness
+     picked for the simulated day.
+    """
+
+    def __init__(self, recordings, locations):
+        self.recordings = recordings
+        self.coordinates = {(loc['lat'], loc['lon']): name
+                            for name, loc in locations.items()}
+        self.n_calls = 0
+
+    def __call__(self, email, password):
+        ## Called like the PySunsetWx constructor in the bot
+        return self
+
+    def get_quality(self, lat, lon, type):
+        self.n_calls += 1
+        name = self.coordinates[(lat, lon)].split(' #')[0]
+        key = f'{name}_{type}.json'
+        if key not in self.recordings:
+            raise KeyError(f'No SunsetWx recording for {name} {type} on or before {SimulatedDatetime.NOW:%Y-%m-%d}')
+
+        with open(self.recordings[key]) as f:
+            response = json.load(f)
+        if 'features' not in response:
+            response = {'features': [{'properties': response}]}
+
+        return response
+
+
+def index_archive(archive_dir):
+    """
+    Index the files of an archive once, so picking a day's files doesn't
+     rescan the archive.  Only directories named %Y-%m-%d count as days.
+
+    :param archive_dir (str): Location of the USA Facts snapshots or SunsetWx recordings
+    :return: dict; {filename: sorted list of days it was archived}
+    """
+
+    index = {}
+    if not os.path.isdir(archive_dir):
+        return index
+    for day in sorted(os.listdir(archive_dir)):
+        try:
+            datetime.strptime(day, "%Y-%m-%d")
+        except ValueError:
+            continue
+        if not os.path.isdir(os.path.join(archive_dir, day)):
+            continue
+        for filename in os.listdir(os.path.join(archive_dir, day)):
+            index.setdefault(filename, []).append(day)
+
+    return index
+
+
+def latest_for_day(archive_dir, index, day):
+    """
+    :return: dict; {filename: path of the latest archived file on or before day}
+    """
+
+    latest = {}
+    for filename, days in index.items():
+        i = bisect.bisect_right(days, day)
+        if i > 0:
+            latest[filename] = os.path.join(archive_dir, days[i - 1], filename)
+
+    return latest
+
+
+class ThreadingServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class SnapshotHandler(SimpleHTTPRequestHandler):
+    """
+    Serves files from serve_dir without per-request logging.  Answers
+     If-Modified-Since itself since Python 3.6's handler always sends the file.
+    """
+
+    serve_dir = None
+
+    def translate_path(self, path):
+        return os.path.join(self.serve_dir, os.path.basename(path.split('?')[0]))
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isfile(path) and 'If-Modified-Since' in self.headers:
+            try:
+                since = email.utils.parsedate_to_datetime(self.headers['If-Modified-Since'])
+            except (TypeError, ValueError, IndexError):
+                since = None
+            if since is not None and int(os.path.getmtime(path)) <= since.timestamp():
+                self.send_response(304)
+                self.end_headers()
+                return None
+
+        return super().send_head()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubUSAFacts():
+    """
+    Local HTTP server publishing the archived USA Facts snapshots.  Files are
+     stamped with the simulated day they were published so conditional
+     requests get a 304 until a new snapshot comes out.
+    """
+
+    def __init__(self, archive_dir, serve_dir):
+        self.archive_dir = archive_dir
+        self.serve_dir = serve_dir
+        self.index = index_archive(archive_dir)
+        self.published = {}
+        os.makedirs(serve_dir, exist_ok = True)
+        handler = type('Handler', (SnapshotHandler,), {'serve_dir': serve_dir})
+        self.server = ThreadingServer(('127.0.0.1', 0), handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target = self.server.serve_forever, daemon = True).start()
+
+    def publish(self, day):
+        """
+        Serve the latest snapshot of each file as of the given day.
+
+        :param day (str): Simulated day in %Y-%m-%d format
+        """
+
+        published_at = time.mktime(datetime.strptime(day, "%Y-%m-%d").timetuple())
+        for filename, source in latest_for_day(self.archive_dir, self.index, day).items():
+            if self.published.get(filename) != source:
+                destination = os.path.join(self.serve_dir, filename)
+                shutil.copyfile(source, destination)
+                os.utime(destination, (published_at, published_at))
+                self.published[filename] = source
+
+    def close(self):
+        self.server.shutdown()
+
+
+def local_url(base_url, url):
+    """
+    Point a USA Facts URL at the local server.
+    """
+
+    return f'{base_url}/{url.rsplit("/", 1)[1]}'
+
+
+## Seeded SunsetWx rows get a date so pandas reads last_run_dt as strings
+SEED_RUN_DT = '2020-01-01'
+SUNSETWX_LOG_FIELDS = ['city', 'type', 'last_run_dt', 'n_poor', 'n_fair',
+                       'n_good', 'n_great', 'avg_quality_score', 'n_runs']
+
+
+def seed_log(bot, log_path, locations):
+    """
+    Write a starting log for a bot when the archive doesn't come with one.
+
+    :param bot (str): Key of the bot in BOTS
+    :param log_path (str): Location of the log to write
+    :param locations (dict): SunsetWx locations
+    """
+
+    with open(log_path, 'w', newline = '') as f:
+        writer = csv.writer(f)
+        if bot == 'sunsetwx':
+            writer.writerow(SUNSETWX_LOG_FIELDS)
+            for name in locations:
+                for type in ['sunrise', 'sunset']:
+                    writer.writerow([name, type, SEED_RUN_DT, 0, 0, 0, 0, 0.0, 0])
+        else:
+            ## Anything after the bot's 3/9 cutoff counts as new
+            writer.writerow(['status', 'plot_filepath', 'data_date', 'location',
+                             'new_case_plot_filepath', 'new_case_status'])
+            for loc in ['DC', 'MD', 'VA', 'All']:
+                writer.writerow(['', '', '2020-03-09', loc, '', ''])
+
+
+def add_missing_locations(log_path, locations):
+    """
+    Append empty SunsetWx log rows for locations the log doesn't have yet,
+     like the clones from --location-multiplier.
+
+    :param log_path (str): Location of the SunsetWx log
+    :param locations (dict): SunsetWx locations
+    """
+
+    with open(log_path, newline = '') as f:
+        reader = csv.DictReader(f)
+        fields = reader.fieldnames
+        logged = set((row['city'], row['type']) for row in reader)
+
+    with open(log_path, 'a', newline = '') as f:
+        writer = csv.DictWriter(f, fieldnames = fields)
+        empty = dict(zip(SUNSETWX_LOG_FIELDS, ['', '', SEED_RUN_DT, 0, 0, 0, 0, 0.0, 0]))
+        for name in locations:
+            for type in ['sunrise', 'sunset']:
+                if (name, type) not in logged:
+                    row = {field: empty.get(field, '') for field in fields}
+                    row.update(city = name, type = type)
+                    writer.writerow(row)
+
+
+def log_size(bot, bot_dir):
+    """
+    Size of the files a bot writes to log/, leaving out the other bot
+     sharing the directory.
+
+    :param bot (str): Key of the bot in BOTS
+    :param bot_dir (str): Sandbox directory the bot runs in
+    :return: tuple of (total bytes, number of files)
+    """
+
+    paths = set(path for pattern in BOTS[bot]['log_files']
+                for path in glob.glob(os.path.join(bot_dir, 'log', pattern)))
+    return sum(os.path.getsize(path) for path in paths), len(paths)
+
+
+def run_child(config_path):
+    """
+    Entry point of the interpreter started for each run: load the bot with the
+     stand-ins in place, run its main() and write the result for the harness.
+
+    :param config_path (str): Location of the run's JSON config
+    :return: int; exit code
+    """
+
+    with open(config_path) as f:
+        config = json.load(f)
+    bot = config['bot']
+    result = {'import_seconds': None, 'main_seconds': None, 'tweets': 0,
+              'sunsetwx_calls': 0, 'error': None}
+
+    ## Stand-ins for the services and the bots' config
+    now = datetime.strptime(config['now'], "%Y-%m-%d %H:%M")
+    twitter = StubTwitter(config['twitter_path'], now, config['strict'],
+                          timedelta(hours = config['duplicate_window_hours']))
+    sunsetwx = StubSunsetWx(config['recordings'], config['locations'])
+    sys.modules['pysunsetwx'] = types.SimpleNamespace(PySunsetWx = sunsetwx)
+    sys.modules['tweet_config'] = types.SimpleNamespace(
+        api_key = 'replay', api_secret = 'replay',
+        access_token = 'replay', access_token_secret = 'replay',
+        sunsetwx_email = 'replay', sunsetwx_password = 'replay',
+        LOCATIONS = config['locations'])
+    SimulatedDatetime.NOW = now
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    sys.path.insert(0, os.path.join(REPO_DIR, BOTS[bot]['dir']))
+    os.chdir(config['bot_dir'])
+
+    try:
+        start = time.perf_counter()
+        spec = importlib.util.spec_from_file_location(
+            f'replay_{bot}', os.path.join(REPO_DIR, BOTS[bot]['dir'], BOTS[bot]['script']))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        result['import_seconds'] = round(time.perf_counter() - start, 4)
+
+        module.api = twitter
+        module.datetime = SimulatedDatetime
+        if bot == 'updates':
+            for series in module.DF_DICT.values():
+                series['url'] = local_url(config['usafacts_url'], series['url'])
+        elif bot == 'maps':
+            module.SERIES_URLS = {series: local_url(config['usafacts_url'], url)
+                                  for series, url in module.SERIES_URLS.items()}
+            module.POPULATION_URL = local_url(config['usafacts_url'], module.POPULATION_URL)
+
+        start = time.perf_counter()
+        module.main()
+        result['main_seconds'] = round(time.perf_counter() - start, 4)
+    except Exception:
+        result['error'] = traceback.format_exc()
+
+    twitter.save()
+    result['tweets'] = twitter.n_posted
+    result['sunsetwx_calls'] = sunsetwx.n_calls
+    with open(config['result_path'], 'w') as f:
+        json.dump(result, f)
+
+    return 0 if result['error'] is None else 1
+
+
+def run_bot(bot, python, config, workdir):
+    """
+    Run one scheduled invocation of a bot in its own interpreter.
+
+    :param bot (str): Key of the bot in BOTS
+    :param python (str): Interpreter of the bot's environment
+    :param config (dict): Run config for run_child()
+    :param workdir (str): Sandbox directory
+    :return: dict; report row without the log sizes
+    """
+
+    config_path = os.path.join(workdir, 'run_config.json')
+    result_path = os.path.join(workdir, 'run_result.json')
+    config = dict(config, result_path = result_path)
+    with open(config_path, 'w') as f:
+        json.dump(config, f)
+    if os.path.exists(result_path):
+        os.remove(result_path)
+
+    start = time.perf_counter()
+    process = subprocess.run([python, os.path.abspath(__file__), '--child', config_path],
+                             stdout = subprocess.PIPE, stderr = subprocess.STDOUT,
+                             universal_newlines = True)
+    seconds = time.perf_counter() - start
+
+    if os.path.exists(result_path):
+        with open(result_path) as f:
+            result = json.load(f)
+    else:
+        ## The interpreter died before the bot could report back
+        result = {'import_seconds': None, 'main_seconds': None, 'tweets': 0,
+                  'sunsetwx_calls': 0, 'error': process.stdout[-2000:]}
+
+    return dict(result,
+                run_time = config['now'],
+                bot = bot,
+                status = 'ok' if result['error'] is None else 'failed',
+                seconds = round(seconds, 4))
+
+
+def replay(archive, bots, workdir, report_path, pythons = None, runs_per_day = 1,
+           location_multiplier = 1, max_days = None, strict = True,
+           duplicate_window_hours = 24):
+    """
+    Replay the archive through the bots day by day.
+
+    :param archive (str): Location of the archive
+    :param bots (list): Keys of the bots in BOTS to run
+    :param workdir (str): Sandbox directory for logs, plots and served files
+    :param report_path (str): Location of the per-run CSV report
+    :param pythons (dict): Interpreter for each bot, defaults to this one
+    :param runs_per_day (int): Scheduled runs per day of the DMV bots
+    :param location_multiplier (int): Copies of each SunsetWx location, for load tests
+    :param max_days (int): Stop after this many simulated days
+    :param strict (bool): Reject duplicate and over-length statuses like Twitter
+    :param duplicate_window_hours (float): How far back statuses count as duplicates
+    :return: list of dicts, one per run
+    """
+
+    pythons = pythons or {}
+    usafacts_dir = os.path.join(archive, 'usafacts')
+    sunsetwx_dir = os.path.join(archive, 'sunsetwx')
+
+    ## SunsetWx locations, cloned at slightly different coordinates to scale up
+    locations = {}
+    if 'sunsetwx' in bots:
+        with open(os.path.join(sunsetwx_dir, 'locations.json')) as f:
+            for name, loc in json.load(f).items():
+                for i in range(location_multiplier):
+                    clone_name = name if i == 0 else f'{name} #{i}'
+                    locations[clone_name] = dict(loc, lat = loc['lat'] + i*1e-6)
+    recordings_index = index_archive(sunsetwx_dir)
+
+    ## Sandbox directories the bots run in
+    bot_dirs = {}
+    for bot in bots:
+        bot_dir = os.path.join(workdir, BOTS[bot]['dir'])
+        bot_dirs[bot] = bot_dir
+        for sub in ['log', 'plots']:
+            os.makedirs(os.path.join(bot_dir, sub), exist_ok = True)
+        if BOTS[bot]['log'] is not None:
+            log_path = os.path.join(bot_dir, 'log', BOTS[bot]['log'])
+            if not os.path.exists(log_path):
+                archived_log = os.path.join(archive, 'logs', BOTS[bot]['log'])
+                if os.path.exists(archived_log):
+                    shutil.copyfile(archived_log, log_path)
+                else:
+                    seed_log(bot, log_path, locations)
+            if bot == 'sunsetwx':
+                add_missing_locations(log_path, locations)
+        if bot == 'maps' and not os.path.exists(os.path.join(bot_dir, 'shapefiles')):
+            ## Shapefiles from the archive, otherwise the ones next to the bot
+            shapefiles = os.path.join(archive, 'shapefiles')
+            if not os.path.exists(shapefiles):
+                shapefiles = os.path.join(REPO_DIR, 'DMV_COVID19', 'shapefiles')
+            shutil.copytree(shapefiles, os.path.join(bot_dir, 'shapefiles'))
+
+    ## Days covered by the archive
+    usafacts = StubUSAFacts(usafacts_dir, os.path.join(workdir, 'usafacts'))
+    days = set()
+    if 'updates' in bots or 'maps' in bots:
+        days.update(day for days_archived in usafacts.index.values() for day in days_archived)
+    if 'sunsetwx' in bots:
+        days.update(day for days_recorded in recordings_index.values() for day in days_recorded)
+    days = sorted(days)[:max_days]
+
+    ## Run times: DMV bots spread through the day, SunsetWx at noon and after 8PM
+    schedule = {'updates': [timedelta(hours = 9 + 12*i/runs_per_day) for i in range(runs_per_day)],
+                'maps': [timedelta(hours = 9 + 12*i/runs_per_day, minutes = 30) for i in range(runs_per_day)],
+                'sunsetwx': [timedelta(hours = 12), timedelta(hours = 20, minutes = 30)]}
+
+    ## Write the report as the replay goes so a crash doesn't lose it
+    results = []
+    try:
+        with open(report_path, 'w', newline = '') as report:
+            writer = csv.DictWriter(report, fieldnames = REPORT_FIELDS)
+            writer.writeheader()
+            for day in days:
+                usafacts.publish(day)
+                recordings = latest_for_day(sunsetwx_dir, recordings_index, day)
+                runs = sorted((datetime.strptime(day, "%Y-%m-%d") + offset, bot)
+                              for bot in bots for offset in schedule[bot])
+                for run_time, bot in runs:
+                    config = {'bot': bot,
+                              'bot_dir': bot_dirs[bot],
+                              'now': run_time.strftime("%Y-%m-%d %H:%M"),
+                              'usafacts_url': usafacts.url,
+                              'recordings': recordings,
+                              'locations': locations,
+                              'twitter_path': os.path.join(bot_dirs[bot], 'twitter.json'),
+                              'strict': strict,
+                              'duplicate_window_hours': duplicate_window_hours}
+                    row = run_bot(bot, pythons.get(bot, sys.executable), config, workdir)
+                    row['log_bytes'], row['log_files'] = log_size(bot, bot_dirs[bot])
+                    writer.writerow(row)
+                    report.flush()
+                    results.append(row)
+                    if row['error'] is not None:
+                        print(f"{row['run_time']} {bot} failed:\n{row['error']}")
+    finally:
+        usafacts.close()
+
+    ## Summarize throughput and log growth by bot
+    print(f'Replayed {len(days)} days, {len(results)} runs. Sandbox: {workdir}')
+    for bot in bots:
+        bot_results = [r for r in results if r['bot'] == bot]
+        if len(bot_results) == 0:
+            continue
+        seconds = sum(r['seconds'] for r in bot_results)
+        import_seconds = sum(r['import_seconds'] or 0 for r in bot_results)
+        growth = (bot_results[-1]['log_bytes'] - bot_results[0]['log_bytes'])/max(len(days) - 1, 1)
+        print(f"{bot}: {len(bot_results)} runs in {seconds:.2f}s "
+              f"({len(bot_results)/max(seconds, 1e-9):.1f} runs/s, "
+              f"{import_seconds:.2f}s of it importing, "
+              f"slowest {max(r['seconds'] for r in bot_results):.2f}s), "
+              f"{sum(1 for r in bot_results if r['status'] == 'failed')} failed, "
+              f"{sum(r['tweets'] for r in bot_results)} tweets, "
+              f"{sum(r['sunsetwx_calls'] for r in bot_results)} SunsetWx calls, "
+              f"log {bot_results[-1]['log_bytes']:,} bytes in {bot_results[-1]['log_files']} files "
+              f"(+{growth:,.0f} bytes/day)")
+    for bot_dir in sorted(set(bot_dirs.values())):
+        twitter_path = os.path.join(bot_dir, 'twitter.json')
+        if os.path.exists(twitter_path):
+            with open(twitter_path) as f:
+                state = json.load(f)
+            print(f"Twitter ({os.path.basename(bot_dir)}): {state['n_media']} images "
+                  f"({state['media_bytes']:,} bytes), {state['n_duplicates']} duplicate and "
+                  f"{state['n_too_long']} over-length statuses")
+
+    return results
+
+
+def main():
+    """
+    Parse the command line and run the replay.
+    """
+
+    ## Started by run_bot() for a single run
+    if len(sys.argv) == 3 and sys.argv[1] == '--child':
+        sys.exit(run_child(sys.argv[2]))
+
+    parser = argparse.ArgumentParser(description = 'Replay archived data through the bots offline.')
+    parser.add_argument('archive', help = 'Directory with usafacts/, sunsetwx/ and optionally logs/')
+    parser.add_argument('--bots', nargs = '+', choices = list(BOTS.keys()),
+                        default = ['updates', 'sunsetwx'])
+    parser.add_argument('--python', nargs = '+', default = [], metavar = 'BOT=PATH',
+                        help = "Interpreter of a bot's environment (default: this one)")
+    parser.add_argument('--workdir', default = None,
+                        help = 'Sandbox directory (default: new temporary directory)')
+    parser.add_argument('--report', default = 'replay_report.csv')
+    parser.add_argument('--runs-per-day', type = int, default = 1,
+                        help = 'Scheduled runs per day of the DMV bots')
+    parser.add_argument('--location-multiplier', type = int, default = 1,
+                        help = 'Copies of each SunsetWx location')
+    parser.add_argument('--days', type = int, default = None,
+                        help = 'Stop after this many simulated days')
+    parser.add_argument('--lenient-twitter', action = 'store_true',
+                        help = 'Count duplicate and over-length statuses instead of raising')
+    parser.add_argument('--duplicate-window-hours', type = float, default = 24,
+                        help = 'How far back (in simulated time) Twitter rejects duplicate statuses')
+    args = parser.parse_args()
+
+    pythons = {bot: os.path.expanduser(path) for bot, path in (p.split('=', 1) for p in args.python)}
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix = 'replay_'))
+    replay(os.path.abspath(args.archive), args.bots, workdir, os.path.abspath(args.report),
+           pythons = pythons,
+           runs_per_day = args.runs_per_day,
+           location_multiplier = args.location_multiplier,
+           max_days = args.days,
+           strict = not args.lenient_twitter,
+           duplicate_window_hours = args.duplicate_window_hours)
+
+
+if __name__ == "__main__":
+    main()